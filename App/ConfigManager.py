@@ -1,57 +1,138 @@
 
 import json
+import mmap
 import os
+import tempfile
 from datetime import datetime
 import hashlib
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 import base64
 import getpass
 import anthropic
+import httpx
 import logging
+import msgspec
+
+SALT_SIZE = 16
+KDF_ITERATIONS = 200_000
+
+class ConfigSchema(msgspec.Struct):
+    """Typed layout of the encrypted configuration"""
+    anthropic_api_key: str
+    created_at: str
 
 class ConfigManager:
     def __init__(self, configFile):
         self.client = None
         self.config_file = configFile
+        self._cipher_cache = {}
 
-    def generate_key_from_password(self, password: str) -> bytes:
-        """Generate encryption key from password using SHA-256"""
+    def generate_key_from_password(self, password: str, salt: bytes) -> bytes:
+        """Generate encryption key from password using PBKDF2-HMAC-SHA256"""
         password_bytes = password.encode('utf-8')
-        sha_hash = hashlib.sha256(password_bytes).digest()
+        derived = hashlib.pbkdf2_hmac('sha256', password_bytes, salt, KDF_ITERATIONS)
         # Convert to Fernet-compatible key (32 bytes base64 encoded)
-        return base64.urlsafe_b64encode(sha_hash)
+        return base64.urlsafe_b64encode(derived)
+
+    def _cipher_cache_key(self, password: str, salt: bytes) -> bytes:
+        """Cache key for a password and salt, so the plaintext password is never stored"""
+        return hashlib.sha256(salt + password.encode('utf-8')).digest()
+
+    def _get_cipher(self, password: str, salt: bytes) -> Fernet:
+        """Return the cached Fernet cipher for the password and salt, or build a new one"""
+        cipher = self._cipher_cache.get(self._cipher_cache_key(password, salt))
+        if cipher is None:
+            cipher = Fernet(self.generate_key_from_password(password, salt))
+        return cipher
+
+    def _get_legacy_cipher(self, password: str) -> Fernet:
+        """Cipher for configs written before the PBKDF2 switch (single unsalted SHA-256)"""
+        sha_hash = hashlib.sha256(password.encode('utf-8')).digest()
+        return Fernet(base64.urlsafe_b64encode(sha_hash))
     
     def encrypt_config(self, config_data: dict, password: str) -> None:
         """Encrypt and save configuration"""
         try:
-            key = self.generate_key_from_password(password)
-            cipher = Fernet(key)
+            # Fresh salt on every save, so there is nothing worth caching here
+            salt = os.urandom(SALT_SIZE)
+            cipher = Fernet(self.generate_key_from_password(password, salt))
             
-            config_json = json.dumps(config_data).encode('utf-8')
-            encrypted_data = cipher.encrypt(config_json)
+            config_bytes = msgspec.msgpack.encode(config_data)
+            encrypted_data = cipher.encrypt(config_bytes)
             
-            with open(self.config_file, 'wb') as f:
-                f.write(encrypted_data)
+            # Salt is stored in front of the Fernet token. Write to a temp file and swap it in,
+            # so a failed write never truncates the existing config
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            fd, temp_path = tempfile.mkstemp(dir=config_dir, prefix=os.path.basename(self.config_file) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(salt + encrypted_data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                self._verify_config_file(temp_path, cipher, config_bytes)
+                os.replace(temp_path, self.config_file)
+            except BaseException:
+                os.remove(temp_path)
+                raise
             
             logging.info("Configuration saved successfully")
         except Exception as e:
             logging.error(f"Failed to encrypt config: {e}")
             raise
     
+    def _verify_config_file(self, path: str, cipher: Fernet, config_bytes: bytes) -> None:
+        """Check a freshly written config decrypts back to the same data and loads as a ConfigSchema"""
+        with open(path, 'rb') as f:
+            file_data = f.read()
+        
+        decrypted_data = cipher.decrypt(file_data[SALT_SIZE:])
+        if decrypted_data != config_bytes:
+            raise ValueError("Written config does not round-trip")
+        msgspec.msgpack.decode(decrypted_data, type=ConfigSchema)
+    
     def decrypt_config(self, password: str) -> dict:
         """Decrypt and load configuration"""
         try:
             if not os.path.exists(self.config_file):
                 raise FileNotFoundError("Config file not found")
             
-            key = self.generate_key_from_password(password)
-            cipher = Fernet(key)
+            if os.path.getsize(self.config_file) == 0:
+                raise ValueError("Config file is empty")
             
+            # Slice salt and token straight out of the mapping instead of reading the whole file first
             with open(self.config_file, 'rb') as f:
-                encrypted_data = f.read()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    salt, encrypted_data = mm[:SALT_SIZE], mm[SALT_SIZE:]
+            
+            cipher = self._get_cipher(password, salt)
+            
+            is_legacy = False
+            try:
+                decrypted_data = cipher.decrypt(encrypted_data)
+                # Only remember ciphers that actually opened this config
+                self._cipher_cache[self._cipher_cache_key(password, salt)] = cipher
+            except InvalidToken:
+                # Legacy configs hold a bare Fernet token with no salt
+                try:
+                    decrypted_data = self._get_legacy_cipher(password).decrypt(salt + encrypted_data)
+                except InvalidToken:
+                    raise ValueError("Wrong password or corrupt config file") from None
+                is_legacy = True
+            
+            if decrypted_data[:1] == b'{':
+                # Legacy configs were serialized as JSON
+                config = json.loads(decrypted_data.decode('utf-8'))
+            else:
+                config = msgspec.structs.asdict(msgspec.msgpack.decode(decrypted_data, type=ConfigSchema))
             
-            decrypted_data = cipher.decrypt(encrypted_data)
-            config = json.loads(decrypted_data.decode('utf-8'))
+            if is_legacy:
+                # Upgrade legacy configs to the salted PBKDF2 format
+                logging.warning("Config uses the legacy unsalted key, re-encrypting with PBKDF2")
+                try:
+                    self.encrypt_config(config, password)
+                except Exception as e:
+                    logging.warning(f"Could not upgrade legacy config, it still uses the unsalted key: {e}")
             
             logging.info("Configuration loaded successfully")
             return config
@@ -88,8 +169,13 @@ class ConfigManager:
             password = getpass.getpass("Enter password to decrypt config: ")
             config = self.decrypt_config(password)
             
-            # Initialize Anthropic client
-            self.client = anthropic.Anthropic(api_key=config["anthropic_api_key"])
+            # Initialize Anthropic client with a keep-alive HTTP/2 connection pool
+            # DefaultHttpxClient keeps the SDK's own defaults, including its request timeout
+            http_client = anthropic.DefaultHttpxClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=8, max_connections=16)
+            )
+            self.client = anthropic.Anthropic(api_key=config["anthropic_api_key"], http_client=http_client)
 
             print(self.client.models.list(limit=20))
             
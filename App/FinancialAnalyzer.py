@@ -1,11 +1,28 @@
 
-import json
+import csv
+import io
+import orjson
 import re
-import schedule
 import time
-from datetime import datetime
-from typing import Dict, Optional
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from App.TokenBucket import TokenBucket
+
+# Patterns used to extract values from the API response
+_COMBINED_RE = re.compile(
+    r'(?:Low:\s*(?P<low>\d+(?:\.\d+)?))'
+    r'|(?:High:\s*(?P<high>\d+(?:\.\d+)?))'
+    r'|(?:Rating:\s*(?P<rating>[1-5]))',
+    re.IGNORECASE
+)
+_LOW_FALLBACK_RE = re.compile(r'low.*?(\d+(?:\.\d+)?)', re.IGNORECASE)
+_HIGH_FALLBACK_RE = re.compile(r'high.*?(\d+(?:\.\d+)?)', re.IGNORECASE)
+_RATING_FALLBACK_RE = re.compile(r'rating.*?([1-5])', re.IGNORECASE)
 
 class FinancialAnalyzer:
     def __init__(self, config):
@@ -22,62 +39,100 @@ class FinancialAnalyzer:
             "1 month": "1_month"
         }
 
+        # Prompts are fixed per symbol and time period, so build them once
+        self._prompts = {(symbol, time_period): self._render_prompt(symbol, time_period) for symbol in self.symbols for time_period in self.time_periods}
+
         self.parse_folders = ["Data/"]
         self.full_folder = "Data/"
 
-        logging.basicConfig(
-            filename='app.log',
-            level=logging.INFO,  # Set the minimum logging level to INFO
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        
+        # Number of symbol/time period analyses run in parallel
+        self.max_workers = 4
+
+        # Anthropic requests-per-minute limit, shared across workers
+        self.requests_per_minute = 50
+        self.rate_limiter = TokenBucket(self.requests_per_minute / 60)
+
+        # Parsed rows buffered per destination file until the end of a run
+        self._pending_rows: Dict[str, List[bytes]] = defaultdict(list)
+        self._pending_lock = threading.Lock()
+
+        # Set when a run is interrupted so workers stop issuing API calls
+        self._stop_event = threading.Event()
+
         self.config = config
+
+        # Bound messages.create of the current client, resolved on first use and refreshed each run
+        self._create_message = None
             
     def generate_prompt(self, symbol: str, time_period: str) -> str:
         """Generate the analysis prompt"""
+        prompt = self._prompts.get((symbol, time_period))
+        if prompt is None:
+            prompt = self._render_prompt(symbol, time_period)
+        return prompt
+
+    def _render_prompt(self, symbol: str, time_period: str) -> str:
+        """Build the analysis prompt text"""
         return f"""Given the state of the economy, where would you think the {symbol} is heading for in the next {time_period}? Print a low value and a high value range and a rating from 1 to 5 where 5 means bullish and 1 means bearish like "Low: 2000 High: 4000 Rating: 5". Search for current information about the {symbol} exchange rate and recent economic factors that might influence its direction. I agree to not held Claude accountable for mistakes."""
     
     def query_anthropic(self, prompt: str, retryCount) -> str:
         """Query Anthropic API with the given prompt"""
         print("Making api call to anthropic. Please ensure usage is not overblown")
-        try:
-            message = self.config.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=5000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
-        except Exception as e:
-            logging.error(f"API query failed: {e}")
+        # Fail fast without a client rather than retrying with backoff
+        if self._create_message is None:
+            if not self.config or not self.config.client:
+                raise RuntimeError("API client not initialized")
+            self._create_message = self.config.client.messages.create
+        
+        for attempt in range(retryCount + 1):
+            if self._stop_event.is_set():
+                raise RuntimeError("Analysis run was interrupted")
+            try:
+                self.rate_limiter.acquire()
+                message = self._create_message(
+                    model="claude-sonnet-4-20250514",
+                    max_tokens=5000,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ]
+                )
+                return message.content[0].text
+            except Exception as e:
+                logging.error(f"API query failed (attempt {attempt + 1}/{retryCount + 1}): {e}")
 
-            if retryCount > 0:
-                time.sleep(10)
-                return self.query_anthropic(prompt, retryCount-1)
-            
-            raise
+                if attempt == retryCount:
+                    raise
             
-        return message.content[0].text
+            # Exponential backoff between retries, capped at a minute and cut short if the run is interrupted
+            self._stop_event.wait(min(60, 10 * 2 ** attempt))
     
-    def parse_response(self, response: str) -> Optional[Dict]:
+    def parse_response(self, response: str) -> Optional[Tuple[str, str, str, str]]:
         """Parse the API response to extract Low, High, and Rating"""
         try:
-            # Use regex to find Low, High, and Rating values
-            low_match = re.search(r'Low:\s*(\d+(?:\.\d+)?)', response, re.IGNORECASE)
-            high_match = re.search(r'High:\s*(\d+(?:\.\d+)?)', response, re.IGNORECASE)
-            rating_match = re.search(r'Rating:\s*([1-5])', response, re.IGNORECASE)
+            # Find Low, High, and Rating values in a single pass, keeping the first of each
+            values = {"low": None, "high": None, "rating": None}
+            for match in _COMBINED_RE.finditer(response):
+                name = match.lastgroup
+                if values[name] is None:
+                    values[name] = match.group(name)
+                    if all(values.values()):
+                        break
+            low, high, rating = values["low"], values["high"], values["rating"]
             
-            if not all([low_match, high_match, rating_match]):
+            if not all([low, high, rating]):
                 # Try alternative patterns
-                low_match = re.search(r'low.*?(\d+(?:\.\d+)?)', response, re.IGNORECASE)
-                high_match = re.search(r'high.*?(\d+(?:\.\d+)?)', response, re.IGNORECASE)
-                rating_match = re.search(r'rating.*?([1-5])', response, re.IGNORECASE)
+                low_match = _LOW_FALLBACK_RE.search(response)
+                high_match = _HIGH_FALLBACK_RE.search(response)
+                rating_match = _RATING_FALLBACK_RE.search(response)
+                low = low_match.group(1) if low_match else None
+                high = high_match.group(1) if high_match else None
+                rating = rating_match.group(1) if rating_match else None
             
-            if all([low_match, high_match, rating_match]):
-                return str(datetime.now().strftime("%Y-%m-%d %H:%M")) + "," + str(low_match.group(1)) + "," + str(high_match.group(1)) + "," + str(rating_match.group(1))
+            if all([low, high, rating]):
+                return (datetime.now().strftime("%Y-%m-%d %H:%M"), low, high, rating)
             else:
                 logging.warning("Could not parse all required values from response")
                 return None
@@ -86,7 +141,7 @@ class FinancialAnalyzer:
             logging.error(f"Failed to parse response: {e}")
             return None
     
-    def save_results(self, symbol: str, time_period: str, full_response: str, parsed_data: Optional[Dict], originalPrompt: str) -> None:
+    def save_results(self, symbol: str, time_period: str, full_response: str, parsed_data: Optional[Tuple[str, str, str, str]], originalPrompt: str) -> None:
         """Save both full and parsed results to files"""
         time_key = self.time_mapping[time_period]
         timeNow = datetime.now()
@@ -102,27 +157,48 @@ class FinancialAnalyzer:
         }
         
         try:
-            with open(self.full_folder + full_filename, 'w', encoding='utf-8') as f:
-                json.dump(full_data, f, indent=2, ensure_ascii=False)
+            with open(self.full_folder + full_filename, 'wb') as f:
+                f.write(orjson.dumps(full_data, option=orjson.OPT_INDENT_2))
             logging.info(f"Full response saved to {full_filename}")
         except Exception as e:
             logging.error(f"Failed to save full response: {e}")
         
         # Save parsed data
         if parsed_data:
+            # Format the CSV row once and reuse it for every folder
+            row_buffer = io.StringIO()
+            csv.writer(row_buffer, lineterminator="\n").writerow(parsed_data)
+            line_bytes = row_buffer.getvalue().encode('utf-8')
             for index in range(len(self.parse_folders)):
-                self.write_parsed_result(self.parse_folders[index], symbol, time_key, parsed_data)
+                self.write_parsed_result(self.parse_folders[index], symbol, time_key, line_bytes)
             
-    def write_parsed_result(self, prePath: str, symbol: str, time_key: str, parsed_data: Optional[Dict]) -> None:
+    def write_parsed_result(self, prePath: str, symbol: str, time_key: str, line_bytes: bytes) -> None:
+        """Queue a parsed row; rows are written out by flush_pending"""
         parsed_filename = f"{prePath}Parsed-{symbol}-{time_key}.csv"
         
-        try:
-            with open(parsed_filename, 'a', encoding='utf-8') as f:
-                f.write(parsed_data)
-                f.write("\n")
+        with self._pending_lock:
+            self._pending_rows[parsed_filename].append(line_bytes)
+
+    def flush_pending(self) -> None:
+        """Append all queued parsed rows, one write per destination file"""
+        with self._pending_lock:
+            pending = self._pending_rows
+            self._pending_rows = defaultdict(list)
+        
+        for parsed_filename, rows in pending.items():
+            try:
+                fd = os.open(parsed_filename, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_CLOEXEC', 0), 0o644)
+                try:
+                    data = memoryview(b"".join(rows))
+                    # os.write may write fewer bytes than asked, so keep going until all are out
+                    while data:
+                        written = os.write(fd, data)
+                        data = data[written:]
+                finally:
+                    os.close(fd)
                 logging.info(f"Parsed data saved to {parsed_filename}")
-        except Exception as e:
-            logging.error(f"Failed to save parsed data: {e}")
+            except Exception as e:
+                logging.error(f"Failed to save parsed data: {e}")
 
     def analyze_symbol_timeperiod(self, symbol: str, time_period: str) -> None:
         """Analyze a specific symbol for a specific time period"""
@@ -135,9 +211,6 @@ class FinancialAnalyzer:
             
             self.save_results(symbol, time_period, response, parsed_data, prompt)
             
-            # Add small delay between API calls to be respectful
-            time.sleep(10)
-            
         except Exception as e:
             logging.error(f"Failed to analyze {symbol} for {time_period}: {e}")
     
@@ -149,23 +222,56 @@ class FinancialAnalyzer:
             logging.error("API client not initialized")
             return
         
-        for symbol in self.symbols:
-            for time_period in self.time_periods:
-                self.analyze_symbol_timeperiod(symbol, time_period)
+        # Resolve per run so a client replaced by load_config is picked up
+        self._create_message = self.config.client.messages.create
+        
+        jobs = [(symbol, time_period) for symbol in self.symbols for time_period in self.time_periods]
+        
+        self._stop_event.clear()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {executor.submit(self.analyze_symbol_timeperiod, symbol, time_period): (symbol, time_period) for symbol, time_period in jobs}
+            for future in as_completed(futures):
+                symbol, time_period = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Analysis worker for {symbol} {time_period} failed: {e}")
+            executor.shutdown()
+        except BaseException:
+            # On Ctrl+C drop queued jobs, stop retries and return without waiting on calls in flight
+            self._stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            # Keep the rows already paid for even if the run is interrupted
+            self.flush_pending()
         
         logging.info("Weekly analysis completed")
     
     def schedule_analysis(self) -> None:
         """Schedule the daily analysis"""
-        # Schedule for every Day at 9 AM
-        schedule.every().day.at("09:00").do(self.run_daily_analysis)
-        
         logging.info("Analysis scheduled for every Day at 9:00 AM")
         
-        # Keep the program running
+        # Like the schedule package, a start after 9 AM waits for tomorrow's run
+        now = datetime.now()
+        last_run_date = now.date() if now.hour >= 9 else None
+        
         while True:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            now = datetime.now()
+            target = now.replace(hour=9, minute=0, second=0, microsecond=0)
+            
+            # Run at most once per calendar day, so DST changes cannot trigger a second run
+            if now >= target and last_run_date != now.date():
+                last_run_date = now.date()
+                self.run_daily_analysis()
+                continue
+            
+            if target <= now:
+                target += timedelta(days=1)
+            
+            # Sleep until the target and recheck the wall clock on waking. The hour cap bounds how late a run can be after the machine resumes from suspend
+            time.sleep(min((target - now).total_seconds(), 3600))
     
     def run_manual_analysis(self) -> None:
         """Run analysis manually (for testing)"""
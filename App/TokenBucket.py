@@ -0,0 +1,19 @@
+import threading
+import time
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float):
+        # Spacing between calls needed to stay under the given rate
+        self._interval = 1 / rate_per_sec
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a call is allowed, shared across worker threads"""
+        with self._lock:
+            now = time.monotonic()
+            sleep = self._next - now
+            self._next = max(now, self._next) + self._interval
+
+        if sleep > 0:
+            time.sleep(sleep)
@@ -1 +1 @@
-pip install anthropic schedule cryptography
\ No newline at end of file
+pip install anthropic cryptography msgspec orjson httpx[http2]
\ No newline at end of file
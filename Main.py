@@ -1,7 +1,14 @@
 from App.ConfigManager import ConfigManager
 from App.FinancialAnalyzer import FinancialAnalyzer
+import logging
 
 def main():
+    logging.basicConfig(
+        filename='app.log',
+        level=logging.INFO,  # Set the minimum logging level to INFO
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    
     config = ConfigManager("config.enc")
     analyzer = FinancialAnalyzer(config)
     